@@ -1,9 +1,23 @@
+import base64
+import hashlib
+import hmac
 import time
 from typing import Any, Dict
 
-import jwt
+import orjson
 from django.conf import settings
 
+# 与 PyJWT 生成的 HS256 token 字节级一致（紧凑 JSON + base64url 去掉 "="），
+# 这样 ws_auth 侧无论走快速路径还是 jwt.decode 都能校验。
+_SECRET: bytes = settings.SECRET_KEY.encode("utf-8")
+
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+HS256_HEADER_B64: bytes = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+
 
 def create_session_token(session_id: str) -> str:
     """
@@ -17,11 +31,7 @@ def create_session_token(session_id: str) -> str:
         "sid": session_id,
         "iat": int(time.time()),
     }
-    token = jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
-
-    # PyJWT may return bytes in some versions, normalize to str
-    if isinstance(token, bytes):
-        token = token.decode("utf-8")
-
-    return token
+    signing_input = HS256_HEADER_B64 + b"." + _b64url(orjson.dumps(payload))
+    signature = hmac.new(_SECRET, signing_input, hashlib.sha256).digest()
 
+    return (signing_input + b"." + _b64url(signature)).decode("ascii")
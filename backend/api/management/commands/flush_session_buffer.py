@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.session_buffer import FLUSH_BATCH_SIZE, flush_session_buffer
+
+
+class Command(BaseCommand):
+    help = "Flush buffered sessions from Redis into the database (write-behind for init_session)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0.1, help="Seconds to sleep when the buffer is drained.")
+        parser.add_argument("--batch-size", type=int, default=FLUSH_BATCH_SIZE)
+        parser.add_argument("--once", action="store_true", help="Drain the buffer once and exit.")
+
+    def handle(self, *args, **options):
+        interval: float = options["interval"]
+        batch_size: int = options["batch_size"]
+
+        while True:
+            # 长期运行的进程没有 request_started/finished 信号，
+            # 需要自己回收过期或已失效的连接（CONN_MAX_AGE / CONN_HEALTH_CHECKS）
+            close_old_connections()
+            flushed = flush_session_buffer(batch_size)
+            while flushed == batch_size:
+                # 队列里可能还有积压，继续取下一批
+                flushed = flush_session_buffer(batch_size)
+
+            if options["once"]:
+                return
+            time.sleep(interval)
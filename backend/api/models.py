@@ -1,11 +1,13 @@
 import uuid
 
 from django.db import models
+from django.utils import timezone
 
 
 class Session(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # 由 init_session 在请求时写入；行经写缓冲延迟落库，不能用 auto_now_add
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     last_active_at = models.DateTimeField(auto_now=True)
     locale = models.CharField(max_length=20, default="en")
     region = models.CharField(max_length=10, default="GLOBAL")
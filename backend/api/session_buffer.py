@@ -0,0 +1,109 @@
+"""
+Session 写缓冲（write-behind）：
+
+init_session 只把行数据 RPUSH 到 Redis 列表，请求路径上不再等待 INSERT；
+由 `python manage.py flush_session_buffer` 定期取出一批，bulk_create 落库。
+
+取出的批次先原子地移到 processing 列表，写库成功后才删除；flusher 在中途
+被杀掉（重新部署 / compose stop）时，下次启动会先重放 processing 里的行。
+因此同一时间只应运行一个 flusher。
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+import redis
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError
+
+from .models import Session
+
+logger = logging.getLogger(__name__)
+
+SESSION_BUFFER_KEY = "signchat:session_buffer"
+# 无法写入的行移到这里，留待人工排查，不阻塞后续批次
+SESSION_DEAD_LETTER_KEY = "signchat:session_buffer:dead"
+# 已取出、尚未确认写入数据库的批次
+SESSION_PROCESSING_KEY = "signchat:session_buffer:processing"
+FLUSH_BATCH_SIZE = 1000
+# Redis 不可达时尽快抛出 RedisError，让 init_session 退回直接写库
+REDIS_SOCKET_TIMEOUT = 1.0
+
+# 行本身的数据问题：移入 dead-letter；其他错误（连接断开、表不存在等）保留 processing 等待重试
+_ROW_ERRORS = (DataError, IntegrityError, ValidationError, ValueError, TypeError)
+
+# 把最多 ARGV[1] 条从缓冲队列头部原子地移到 processing 列表
+_CLAIM_BATCH_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    for _, item in ipairs(items) do
+        redis.call('RPUSH', KEYS[2], item)
+    end
+end
+return items
+"""
+
+_client: Optional[redis.Redis] = None
+
+
+def _get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=int(settings.REDIS_PORT),
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+        )
+    return _client
+
+
+def enqueue_session(fields: Dict[str, Any]) -> None:
+    """
+    把一行 Session 数据（包含已生成的 id）写入缓冲队列。
+    Redis 不可用时抛出 redis.RedisError，由调用方决定是否直接落库。
+    """
+    _get_client().rpush(SESSION_BUFFER_KEY, orjson.dumps(fields))
+
+
+def flush_session_buffer(batch_size: int = FLUSH_BATCH_SIZE) -> int:
+    """
+    取出最多 batch_size 条缓冲数据并批量写入数据库，返回处理的条数。
+    整批写入失败时逐行重试，数据本身有问题的行移入 dead-letter 队列；
+    其他错误直接抛出，批次留在 processing 列表里，下次调用时重放。
+    """
+    client = _get_client()
+    # 上次未确认的批次优先重放；ignore_conflicts 保证重复插入无害
+    items: List[bytes] = client.lrange(SESSION_PROCESSING_KEY, 0, -1)
+    if not items:
+        items = client.eval(_CLAIM_BATCH_SCRIPT, 2, SESSION_BUFFER_KEY, SESSION_PROCESSING_KEY, batch_size)
+    if not items:
+        return 0
+
+    rows: List[Tuple[bytes, Session]] = []
+    for item in items:
+        try:
+            rows.append((item, Session(**orjson.loads(item))))
+        except (orjson.JSONDecodeError, TypeError):
+            logger.error("malformed buffered session, moving to dead letter: %r", item)
+            client.rpush(SESSION_DEAD_LETTER_KEY, item)
+
+    try:
+        Session.objects.bulk_create([s for _, s in rows], batch_size=batch_size, ignore_conflicts=True)
+    except _ROW_ERRORS:
+        _insert_one_by_one(client, rows)
+
+    # 写库已提交（autocommit），确认这一批
+    client.delete(SESSION_PROCESSING_KEY)
+    return len(items)
+
+
+def _insert_one_by_one(client: redis.Redis, rows: List[Tuple[bytes, Session]]) -> None:
+    for item, session in rows:
+        try:
+            Session.objects.bulk_create([session], ignore_conflicts=True)
+        except _ROW_ERRORS:
+            logger.exception("buffered session rejected by database, moving to dead letter: %r", item)
+            client.rpush(SESSION_DEAD_LETTER_KEY, item)
@@ -1,40 +1,109 @@
-import json
+import logging
+import os
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Optional
 
-from django.http import JsonResponse
+import orjson
+import redis
+from django.http import HttpResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
 from .auth import create_session_token
 from .models import Session
+from .session_buffer import enqueue_session
+
+logger = logging.getLogger(__name__)
+
+# 预取的 session id：一次 os.urandom 生成一批 uuid4，而不是每个请求读一次随机数
+_UUID_POOL_SIZE = 256
+_UUID_POOL: Deque[uuid.UUID] = deque()
+# fork 出的子进程不能复用父进程里已生成的 id
+os.register_at_fork(after_in_child=_UUID_POOL.clear)
+
+
+def _next_session_id() -> uuid.UUID:
+    try:
+        return _UUID_POOL.popleft()
+    except IndexError:
+        buf = os.urandom(16 * _UUID_POOL_SIZE)
+        # UUID(version=4) 会设置 version / variant 位，与 uuid.uuid4() 等价
+        _UUID_POOL.extend(
+            uuid.UUID(bytes=buf[i:i + 16], version=4) for i in range(16, len(buf), 16)
+        )
+        return uuid.UUID(bytes=buf[:16], version=4)
+
+
+# 客户端可传入的文本字段及默认值；入缓冲前按模型的 max_length 校验，
+# 否则一条坏数据会让 flush 时整批 bulk_create 失败
+_SESSION_TEXT_FIELDS = {
+    "locale": "en",
+    "region": "GLOBAL",
+    "sign_language": "NONE",
+    "purpose": "chat",
+}
+
+
+def _invalid_session_field(data: Dict[str, Any]) -> Optional[str]:
+    """
+    返回第一个不合法的字段名；全部合法时返回 None。
+    """
+    for name in _SESSION_TEXT_FIELDS:
+        if name not in data:
+            continue
+        value = data[name]
+        max_length = Session._meta.get_field(name).max_length
+        # Postgres text 不接受 NUL 字符
+        if not isinstance(value, str) or len(value) > max_length or "\x00" in value:
+            return name
+    return None
+
+
+def _json_response(data, status: int = 200) -> HttpResponse:
+    return HttpResponse(orjson.dumps(data), status=status, content_type="application/json")
 
 
 def health(request):
-    return JsonResponse({"status": "ok"})
+    return _json_response({"status": "ok"})
 
 
 @csrf_exempt
 def init_session(request):
     if request.method != "POST":
-        return JsonResponse({"detail": "Method not allowed"}, status=405)
+        return _json_response({"detail": "Method not allowed"}, status=405)
 
     try:
-        raw_body = request.body.decode("utf-8") if request.body else "{}"
-        data = json.loads(raw_body or "{}")
-    except json.JSONDecodeError:
-        return JsonResponse({"detail": "Invalid JSON"}, status=400)
-
-    session = Session.objects.create(
-        locale=data.get("locale", "en"),
-        region=data.get("region", "GLOBAL"),
-        sign_language=data.get("sign_language", "NONE"),
-        purpose=data.get("purpose", "chat"),
-        allow_data_use=bool(data.get("allow_data_use", False)),
-    )
+        data = orjson.loads(request.body) if request.body else {}
+    except orjson.JSONDecodeError:
+        return _json_response({"detail": "Invalid JSON"}, status=400)
+
+    if not isinstance(data, dict):
+        return _json_response({"detail": "Invalid JSON"}, status=400)
+    invalid_field = _invalid_session_field(data)
+    if invalid_field:
+        return _json_response({"detail": f"Invalid {invalid_field}"}, status=400)
+
+    # id 在这里生成，token 可以同步返回；行数据交给写缓冲批量落库
+    session_id = str(_next_session_id())
+    fields: Dict[str, Any] = {
+        "id": session_id,
+        **{name: data.get(name, default) for name, default in _SESSION_TEXT_FIELDS.items()},
+        "allow_data_use": bool(data.get("allow_data_use", False)),
+        # 请求时刻，而不是 flusher 落库的时刻
+        "created_at": timezone.now(),
+    }
+    try:
+        enqueue_session(fields)
+    except redis.RedisError:
+        logger.warning("session buffer unavailable, writing session directly", exc_info=True)
+        Session.objects.create(**fields)
 
-    token = create_session_token(str(session.id))
+    token = create_session_token(session_id)
 
-    return JsonResponse(
+    return _json_response(
         {
-            "session_id": str(session.id),
+            "session_id": session_id,
             "token": token,
         }
     )
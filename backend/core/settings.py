@@ -15,6 +15,10 @@ environ.Env.read_env(str(BASE_DIR / ".env.example"))
 SECRET_KEY: str = env("DJANGO_SECRET_KEY")
 DEBUG: bool = env("DJANGO_DEBUG")
 
+# LAN_IP may be passed separately by compose or dev scripts.
+# Parsed once here and shared by the ALLOWED_HOSTS / CSRF builders below.
+LAN_IP: str = env("LAN_IP", default="").strip()
+
 
 # ── ALLOWED_HOSTS ────────────────────────────────────────
 # Assemble from DJANGO_ALLOWED_HOSTS (comma-separated) + LAN_IP (single value).
@@ -25,10 +29,8 @@ def _build_allowed_hosts() -> List[str]:
     raw: str = env("DJANGO_ALLOWED_HOSTS", default="")
     hosts: List[str] = [h.strip() for h in raw.split(",") if h.strip()]
 
-    # LAN_IP may be passed separately by compose or dev scripts
-    lan_ip: str = env("LAN_IP", default="").strip()
-    if lan_ip:
-        hosts.append(lan_ip)
+    if LAN_IP:
+        hosts.append(LAN_IP)
 
     # Dev baseline: always reachable from loopback
     for h in ("localhost", "127.0.0.1", "0.0.0.0"):
@@ -49,9 +51,8 @@ def _build_csrf_trusted_origins() -> List[str]:
     raw: str = env("DJANGO_CSRF_TRUSTED_ORIGINS", default="")
     origins: List[str] = [o.strip() for o in raw.split(",") if o.strip()]
 
-    lan_ip: str = env("LAN_IP", default="").strip()
-    if lan_ip:
-        for origin in (f"https://{lan_ip}:3000", f"https://{lan_ip}:8001"):
+    if LAN_IP:
+        for origin in (f"https://{LAN_IP}:3000", f"https://{LAN_IP}:8001"):
             if origin not in origins:
                 origins.append(origin)
 
@@ -129,6 +130,13 @@ DATABASES = {
         "PASSWORD": env("DB_PASSWORD"),
         "HOST": env("DB_HOST"),
         "PORT": env("DB_PORT"),
+        # Default 0: under ASGI (daphne) every request's sync code runs on a fresh
+        # thread, so per-thread persistent connections are never reused and only
+        # pile up (Django ticket #33497). Put a pooler such as pgbouncer in front
+        # of Postgres for connection reuse there. Long-running sync processes
+        # (e.g. flush_session_buffer) can opt in via DB_CONN_MAX_AGE.
+        "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", default=0),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -1,9 +1,13 @@
 import asyncio
 import logging
 import uuid
-from collections import deque
-from typing import Deque, Dict, Optional, TypedDict
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple, TypedDict
 
+import orjson
+import zstandard
+from channels.exceptions import ChannelFull
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
 logger = logging.getLogger(__name__)
@@ -14,12 +18,87 @@ class WaitingUser(TypedDict):
     region: str
 
 
-RANDOM_QUEUE: Deque[WaitingUser] = deque()
-REGION_QUEUES: Dict[str, Deque[WaitingUser]] = {}
-QUEUE_LOCK = asyncio.Lock()
+# 按 channel_name 索引的有序队列：FIFO 出队和按 channel 移除都是 O(1)
+WaitingQueue = OrderedDict[str, WaitingUser]
 
+RANDOM_QUEUE: WaitingQueue = OrderedDict()
+REGION_QUEUES: Dict[str, WaitingQueue] = {}
 
-class EchoConsumer(AsyncJsonWebsocketConsumer):
+
+class _RegionLock:
+    """
+    region 锁 + 当前持有/等待者计数；计数归零即从 REGION_LOCKS 移除。
+    region 由客户端传入（支持自定义），不能让锁表随之无限增长。
+    """
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+# 按队列分片加锁：不同 region 的匹配互不阻塞
+RANDOM_LOCK = asyncio.Lock()
+REGION_LOCKS: Dict[str, _RegionLock] = {}
+
+
+@asynccontextmanager
+async def _queue_lock(mode: str, region: str) -> AsyncIterator[None]:
+    if mode == "random":
+        async with RANDOM_LOCK:
+            yield
+        return
+
+    entry = REGION_LOCKS.get(region)
+    if entry is None:
+        entry = REGION_LOCKS[region] = _RegionLock()
+    entry.users += 1
+    try:
+        async with entry.lock:
+            yield
+    finally:
+        entry.users -= 1
+        if entry.users == 0:
+            REGION_LOCKS.pop(region, None)
+
+
+# 超过该大小的聊天消息（主要是 rtc_signal 里的 SDP）先用 zstd 压缩再经过 channel layer
+CHAT_COMPRESS_MIN_BYTES = 1024
+_ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=1)
+_ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+
+# chat 帧的固定部分预先编码好，chat_message 只需拼接 room_id 和 message
+_CHAT_PREFIX = b'{"type":"chat","room_id":"'
+_CHAT_MESSAGE_SEP = b'","message":'
+
+
+def _chat_event(room_id: str, message_json: bytes) -> dict:
+    # message 只在 handle_chat 里编码一次，之后全程以 JSON bytes 传递
+    if len(message_json) < CHAT_COMPRESS_MIN_BYTES:
+        return {"type": "chat.message", "room_id": room_id, "message_json": message_json}
+    return {
+        "type": "chat.message",
+        "room_id": room_id,
+        "message_zstd": _ZSTD_COMPRESSOR.compress(message_json),
+    }
+
+
+class OrjsonWebsocketConsumer(AsyncJsonWebsocketConsumer):
+    """
+    用 orjson 替换 Channels 默认的 stdlib json 编解码
+    """
+
+    @classmethod
+    async def decode_json(cls, text_data):
+        return orjson.loads(text_data)
+
+    @classmethod
+    async def encode_json(cls, content):
+        return orjson.dumps(content).decode("utf-8")
+
+
+class EchoConsumer(OrjsonWebsocketConsumer):
     async def connect(self):
         await self.accept()
 
@@ -28,7 +107,7 @@ class EchoConsumer(AsyncJsonWebsocketConsumer):
         await self.send_json({"echo": content})
 
 
-class MatchConsumer(AsyncJsonWebsocketConsumer):
+class MatchConsumer(OrjsonWebsocketConsumer):
     """
     最小可用的匹配 + 房间广播逻辑（单机内存队列版）
     """
@@ -39,6 +118,10 @@ class MatchConsumer(AsyncJsonWebsocketConsumer):
         self.mode: Optional[str] = None  # "random" | "region" | None
         self.room_id: Optional[str] = None
         self.room_group_name: Optional[str] = None
+        # 房间里另一方的 channel_name；房间固定两人，聊天消息直接点对点发送
+        self.peer_channel: Optional[str] = None
+        # 当前所在的等待队列 (mode, region)，未排队时为 None
+        self.queue_key: Optional[Tuple[str, str]] = None
 
     async def connect(self):
         await self.accept()
@@ -51,6 +134,8 @@ class MatchConsumer(AsyncJsonWebsocketConsumer):
                 self.room_group_name,
                 {
                     "type": "chat.peer_left",
+                    "room_id": self.room_id,
+                    "from_channel": self.channel_name,
                 },
             )
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
@@ -78,24 +163,33 @@ class MatchConsumer(AsyncJsonWebsocketConsumer):
         region = content.get("region") or "GLOBAL"
         self.region = region
 
-        logger.info(
-            "[signal] handle_find mode=%s region=%s channel=%s",
-            mode, region, self.channel_name,
-        )
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "[signal] handle_find mode=%s region=%s channel=%s",
+                mode, region, self.channel_name,
+            )
+
+        # 重复 find 时先离开之前的队列，保证同一时间只在一个队列里
+        await self._remove_from_queues()
 
-        async with QUEUE_LOCK:
+        async with _queue_lock(mode, region):
             if mode == "random":
-                logger.info("[signal] RANDOM_QUEUE length before match: %d", len(RANDOM_QUEUE))
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("[signal] RANDOM_QUEUE length before match: %d", len(RANDOM_QUEUE))
                 await self._match_in_queue(RANDOM_QUEUE, region)
             else:
-                queue = REGION_QUEUES.setdefault(region, deque())
-                logger.info("[signal] REGION_QUEUE[%s] length before match: %d", region, len(queue))
+                queue = REGION_QUEUES.setdefault(region, OrderedDict())
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("[signal] REGION_QUEUE[%s] length before match: %d", region, len(queue))
                 await self._match_in_queue(queue, region)
+                # 匹配取走了最后一个等待者时，同样移除空队列
+                if not queue:
+                    REGION_QUEUES.pop(region, None)
 
-    async def _match_in_queue(self, queue: Deque[WaitingUser], region: str):
+    async def _match_in_queue(self, queue: WaitingQueue, region: str):
         # 如果已有等待者，则配对
         while queue:
-            waiting = queue.popleft()
+            _, waiting = queue.popitem(last=False)
             # 防御：如果 channel 已经失效，简单跳过
             if waiting["channel_name"] == self.channel_name:
                 # 自己已经在队列中，忽略
@@ -105,39 +199,43 @@ class MatchConsumer(AsyncJsonWebsocketConsumer):
             room_group_name = f"room_{room_id}"
             self.room_id = room_id
             self.room_group_name = room_group_name
+            self.peer_channel = waiting["channel_name"]
 
-            # 当前用户加入房间 group
+            # 当前用户先加入房间 group：对方收到 match.join 后可能立即离开并
+            # group_send peer_left，此时必须已在 group 里才能收到
             await self.channel_layer.group_add(room_group_name, self.channel_name)
 
-            # 通知对方加入房间，并发送 matched
-            await self.channel_layer.send(
-                waiting["channel_name"],
-                {
-                    "type": "match.join",
-                    "room_id": room_id,
-                    "peer_region": self.region,
-                },
-            )
-
-            # 给自己发送 matched
-            await self.send_json(
-                {
-                    "type": "matched",
-                    "room_id": room_id,
-                    "peer": {
-                        "region": waiting["region"],
+            # 以下两步互不依赖，并发执行：
+            # - 通知对方加入房间，并发送 matched
+            # - 给自己发送 matched
+            await asyncio.gather(
+                self.channel_layer.send(
+                    waiting["channel_name"],
+                    {
+                        "type": "match.join",
+                        "room_id": room_id,
+                        "peer_region": self.region,
+                        "from_channel": self.channel_name,
                     },
-                }
+                ),
+                self.send_json(
+                    {
+                        "type": "matched",
+                        "room_id": room_id,
+                        "peer": {
+                            "region": waiting["region"],
+                        },
+                    }
+                ),
             )
             return
 
         # 没有等待者，把自己加入队列
-        queue.append(
-            {
-                "channel_name": self.channel_name,
-                "region": region,
-            }
-        )
+        queue[self.channel_name] = {
+            "channel_name": self.channel_name,
+            "region": region,
+        }
+        self.queue_key = (self.mode, region)
         await self.send_json({"type": "queued"})
 
     async def handle_cancel(self):
@@ -147,11 +245,14 @@ class MatchConsumer(AsyncJsonWebsocketConsumer):
                 self.room_group_name,
                 {
                     "type": "chat.peer_left",
+                    "room_id": self.room_id,
+                    "from_channel": self.channel_name,
                 },
             )
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
             self.room_group_name = None
             self.room_id = None
+            self.peer_channel = None
         await self.send_json({"type": "cancelled"})
 
     async def handle_chat(self, content):
@@ -165,8 +266,12 @@ class MatchConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({"error": "not_in_room"})
             return
 
-        # [signal] Log RTC signal relay for debugging
-        if isinstance(message, dict) and message.get("kind") == "rtc_signal":
+        # [signal] Log RTC signal relay for debugging（INFO 关闭时跳过参数计算）
+        if (
+            logger.isEnabledFor(logging.INFO)
+            and isinstance(message, dict)
+            and message.get("kind") == "rtc_signal"
+        ):
             sig = message.get("signal", {})
             logger.info(
                 "[signal] relay rtc_signal room=%s from_channel=%s kind=%s clientId=%s",
@@ -176,35 +281,42 @@ class MatchConsumer(AsyncJsonWebsocketConsumer):
                 sig.get("clientId") if isinstance(sig, dict) else "?",
             )
 
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "chat.message",
-                "room_id": room_id,
-                "message": message,
-            },
-        )
+        message_json = orjson.dumps(message)
+        if self.peer_channel:
+            try:
+                await self.channel_layer.send(self.peer_channel, _chat_event(room_id, message_json))
+            except ChannelFull:
+                # 与原 group_send 行为一致：对方 channel 已满（卡住或 worker 已退出）时丢弃该消息
+                logger.warning(
+                    "[signal] peer channel full, dropping chat room=%s peer_channel=%s",
+                    room_id, self.peer_channel,
+                )
+        # 发送方也会收到自己的消息（前端依赖这份回显），直接复用编码结果拼帧，不经过 channel layer
+        await self._send_chat_frame(message_json)
 
     async def _remove_from_queues(self):
-        async with QUEUE_LOCK:
-            # 从 random 队列移除
-            self._filter_queue(RANDOM_QUEUE)
-
-            # 从所有 region 队列移除
-            for region, q in list(REGION_QUEUES.items()):
-                self._filter_queue(q)
-                if not q:
-                    REGION_QUEUES.pop(region, None)
+        # 只锁自己所在的那个队列
+        if self.queue_key is None:
+            return
+        async with _queue_lock(*self.queue_key):
+            self._leave_queue()
 
-    def _filter_queue(self, queue: Deque[WaitingUser]):
-        if not queue:
+    def _leave_queue(self):
+        # 只需从自己所在的那个队列移除，无需扫描所有队列
+        if self.queue_key is None:
             return
-        tmp: Deque[WaitingUser] = deque()
-        while queue:
-            item = queue.popleft()
-            if item["channel_name"] != self.channel_name:
-                tmp.append(item)
-        queue.extend(tmp)
+        mode, region = self.queue_key
+        self.queue_key = None
+
+        if mode == "random":
+            RANDOM_QUEUE.pop(self.channel_name, None)
+            return
+
+        queue = REGION_QUEUES.get(region)
+        if queue is not None:
+            queue.pop(self.channel_name, None)
+            if not queue:
+                REGION_QUEUES.pop(region, None)
 
     # === Channel layer handlers ===
 
@@ -219,6 +331,10 @@ class MatchConsumer(AsyncJsonWebsocketConsumer):
 
         self.room_id = room_id
         self.room_group_name = f"room_{room_id}"
+        self.peer_channel = event.get("from_channel")
+        # 原队列条目已被对方取出；若在 match.join 到达前又发了 find 重新排队，
+        # 这里也要把新的条目移除，避免断开后留下无法清理的等待者
+        await self._remove_from_queues()
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
@@ -231,14 +347,26 @@ class MatchConsumer(AsyncJsonWebsocketConsumer):
         )
 
     async def chat_message(self, event):
-        await self.send_json(
-            {
-                "type": "chat",
-                "room_id": event["room_id"],
-                "message": event["message"],
-            }
-        )
+        # 点对点发送不再受 group 成员关系约束，丢弃发往旧房间的消息
+        if event["room_id"] != self.room_id:
+            return
+        # 压缩过的消息本身就是 orjson 编码结果，解压后直接拼接，无需再 loads / dumps
+        if "message_zstd" in event:
+            message_json = _ZSTD_DECOMPRESSOR.decompress(event["message_zstd"])
+        else:
+            message_json = event["message_json"]
+        await self._send_chat_frame(message_json)
+
+    async def _send_chat_frame(self, message_json: bytes):
+        # 调用方已确认消息属于 self.room_id（服务端生成的 uuid），无需 JSON 转义
+        frame = _CHAT_PREFIX + self.room_id.encode() + _CHAT_MESSAGE_SEP + message_json + b"}"
+        await self.send(text_data=frame.decode("utf-8"))
 
     async def chat_peer_left(self, event):
+        # group 里也包含离开者自己；另外离开者可能已 cancel 后重新匹配到新房间，
+        # 只处理当前房间里对方发出的通知，避免误清新房间的 peer_channel
+        if event.get("from_channel") == self.channel_name or event.get("room_id") != self.room_id:
+            return
+        self.peer_channel = None
         await self.send_json({"type": "peer_left"})
 
@@ -1,9 +1,113 @@
-from typing import Any, Dict
-from urllib.parse import parse_qs
+import base64
+import binascii
+import hashlib
+import hmac
+import time
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+from urllib.parse import unquote_to_bytes
 
 import jwt
+import orjson
 from django.conf import settings
 
+from api.auth import HS256_HEADER_B64
+
+# 在模块加载时解析一次，避免每次握手都经过 LazySettings
+_SECRET: str = settings.SECRET_KEY
+_SECRET_BYTES: bytes = _SECRET.encode("utf-8")
+_ALGS = ("HS256",)
+# 预先完成 HMAC 的密钥准备，每次校验只 copy()，省去重复的 key schedule
+_HMAC_PROTO = hmac.new(_SECRET_BYTES, b"", hashlib.sha256)
+
+
+def _b64url_decode(segment: bytes) -> bytes:
+  try:
+      return base64.urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+  except (binascii.Error, ValueError) as exc:
+      raise jwt.DecodeError("Invalid base64 segment") from exc
+
+
+def _extract_token(query_string: bytes) -> Optional[bytes]:
+  """
+  只取 ?token=... 这一个参数：直接在 bytes 上查找并切片，
+  避免 parse_qs 对整个 query string 做 decode / split / unquote。
+  """
+  pos = query_string.find(b"token=")
+  # 必须是参数名开头（首位或紧跟 "&"），避免误匹配 "xtoken=..."
+  while pos > 0 and query_string[pos - 1] != ord("&"):
+      pos = query_string.find(b"token=", pos + 1)
+  if pos < 0:
+      return None
+
+  start = pos + len(b"token=")
+  end = query_string.find(b"&", start)
+  value = query_string[start:] if end < 0 else query_string[start:end]
+  if b"%" in value:
+      value = unquote_to_bytes(value)
+  return value or None
+
+
+def _decode_token(token: bytes) -> Dict[str, Any]:
+  """
+  HS256 快速路径：header 与 create_session_token 生成的完全一致时，
+  直接用 hmac + compare_digest 校验签名，跳过 PyJWT；
+  其他 header（非 HS256 / 第三方签发）仍交给 jwt.decode 处理。
+  """
+  parts = token.split(b".")
+  if len(parts) != 3 or parts[0] != HS256_HEADER_B64:
+      return jwt.decode(token, _SECRET, algorithms=_ALGS)
+
+  header_b64, payload_b64, signature_b64 = parts
+  mac = _HMAC_PROTO.copy()
+  mac.update(header_b64 + b"." + payload_b64)
+  if not hmac.compare_digest(mac.digest(), _b64url_decode(signature_b64)):
+      raise jwt.InvalidSignatureError("Signature verification failed")
+
+  try:
+      payload = orjson.loads(_b64url_decode(payload_b64))
+  except orjson.JSONDecodeError as exc:
+      raise jwt.DecodeError("Invalid payload") from exc
+  if not isinstance(payload, dict):
+      raise jwt.DecodeError("Invalid payload")
+
+  # 与 jwt.decode 默认行为保持一致：校验 exp / nbf / iat
+  now = time.time()
+  try:
+      _check_exp(payload)
+      if "nbf" in payload and int(payload["nbf"]) > now:
+          raise jwt.ImmatureSignatureError("The token is not yet valid (nbf)")
+  except (TypeError, ValueError) as exc:
+      raise jwt.DecodeError("Invalid exp/nbf claim") from exc
+
+  if "iat" in payload:
+      try:
+          iat = int(payload["iat"])
+      except (TypeError, ValueError) as exc:
+          raise jwt.InvalidIssuedAtError("Issued At claim (iat) must be an integer.") from exc
+      if iat > now:
+          raise jwt.ImmatureSignatureError("The token is not yet valid (iat)")
+
+  return payload
+
+
+def _check_exp(payload: Mapping[str, Any]) -> None:
+  if "exp" in payload and int(payload["exp"]) <= time.time():
+      raise jwt.ExpiredSignatureError("Signature has expired")
+
+
+@lru_cache(maxsize=4096)
+def _verify_token(token: bytes) -> Tuple[Optional[str], Mapping[str, Any]]:
+  """
+  重连时同一个 token 会被反复校验，按 token bytes 缓存校验结果。
+  校验失败会抛异常，不会进入缓存；exp 由调用方在每次命中后重新检查。
+  缓存的 payload 会被多个连接共享，因此以只读视图返回。
+  """
+  payload = _decode_token(token)
+  # 与现有 payload 结构兼容：包含 sid
+  return payload.get("sid") or payload.get("session_id"), MappingProxyType(payload)
+
 
 class JwtAuthMiddleware:
   """
@@ -22,10 +126,7 @@ class JwtAuthMiddleware:
       if scope.get("type") != "websocket":
           return await self.app(scope, receive, send)
 
-      query_string = scope.get("query_string", b"")
-      params = parse_qs(query_string.decode("utf-8"))
-      token_list = params.get("token")
-      token = token_list[0] if token_list else None
+      token = _extract_token(scope.get("query_string", b""))
 
       if not token:
           await send({"type": "websocket.close", "code": 4401})
@@ -33,21 +134,24 @@ class JwtAuthMiddleware:
 
       try:
           # 与 create_session_token 保持一致：HS256 + SECRET_KEY
-          payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+          session_id, payload = _verify_token(token)
+          _check_exp(payload)
       except jwt.PyJWTError:
           await send({"type": "websocket.close", "code": 4401})
           return
 
-      # 与现有 payload 结构兼容：包含 sid
-      session_id = payload.get("sid") or payload.get("session_id")
-
-      scope = dict(scope)
-      scope["user_session"] = {
-          "session_id": session_id,
-          "payload": payload,
-      }
-
-      return await self.app(scope, receive, send)
+      # 不修改上游传入的 scope，一次构造出带 user_session 的新 scope
+      return await self.app(
+          {
+              **scope,
+              "user_session": {
+                  "session_id": session_id,
+                  "payload": payload,
+              },
+          },
+          receive,
+          send,
+      )
 
 
 def JwtAuthMiddlewareStack(inner):
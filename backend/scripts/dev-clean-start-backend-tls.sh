@@ -33,8 +33,8 @@ if [ ! -f "$CERT_FILE" ] || [ ! -f "$KEY_FILE" ]; then
   mkcert -cert-file "$HOME/certs/dev.pem" -key-file "$HOME/certs/dev-key.pem" localhost 127.0.0.1 ::1 "$LAN_IP"
 fi
 
-echo "[backend-tls] starting backend_tls..."
-docker compose up -d --build backend_tls
+echo "[backend-tls] starting backend_tls + session_flusher..."
+docker compose up -d --build session_flusher backend_tls
 
 echo "[backend-tls] waiting for TLS ready on https://${LAN_IP}:8001/ (up to 20s)..."
 tls_ready=0
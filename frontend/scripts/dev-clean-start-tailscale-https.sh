@@ -158,8 +158,8 @@ export TURN_EXTERNAL_IP="$TS_IP"
 cd "$PROJECT_DIR"
 
 # --- backend_tls ---
-echo "  starting backend_tls (LAN_IP=$TS_IP) ..."
-docker compose up -d --build backend_tls 2>&1 | while IFS= read -r line; do echo "    $line"; done
+echo "  starting backend_tls + session_flusher (LAN_IP=$TS_IP) ..."
+docker compose up -d --build session_flusher backend_tls 2>&1 | while IFS= read -r line; do echo "    $line"; done
 
 # Wait for backend_tls health (up to 20s)
 be_ready=0